@@ -10,12 +10,63 @@
 
 注意：INT8量化版本不支持（ONNX Runtime Android不支持ConvInteger操作符）
 注意：现在包含3个模型文件 + 3个配置文件，总共6个必需文件
+
+可选加速：pip install hf_transfer
+    安装到同一Python环境后自动启用，由Rust实现的多连接下载并行写入大文件（3个ONNX模型文件受益最明显）
+    如需关闭：设置环境变量 HF_HUB_ENABLE_HF_TRANSFER=0
 """
 
 import os
-from huggingface_hub import hf_hub_download
+
+
+def enable_parallel_download_env():
+    """
+    启用huggingface_hub的加速下载选项
+    
+    huggingface_hub在导入时就读取这些环境变量，因此必须在导入huggingface_hub之前调用。
+    仅在安装了hf_transfer时才启用HF_HUB_ENABLE_HF_TRANSFER，
+    否则huggingface_hub会直接报错而不是回退到普通下载
+    """
+    try:
+        import hf_transfer  # noqa: F401
+        os.environ.setdefault("HF_HUB_ENABLE_HF_TRANSFER", "1")
+    except ImportError:
+        pass
+    os.environ.setdefault("HF_ENABLE_PARALLEL_DOWNLOADING", "true")
+
+enable_parallel_download_env()
+
+from huggingface_hub import HfApi, snapshot_download  # noqa: E402
+
+# snapshot_download内部并发下载的线程数
+MAX_WORKERS = 8
+
+def find_missing_files(repo_id, local_dir, required_files):
+    """
+    返回本地缺失或大小与远端不一致的文件
+    
+    只调用一次API获取所有文件的大小，已完整下载的文件直接跳过，
+    不再为每个文件发送一次ETag校验请求；获取失败时认为所有文件都需要下载
+    """
+    try:
+        siblings = HfApi().model_info(repo_id, files_metadata=True).siblings
+    except Exception as e:
+        print(f"⚠️ 获取远端文件大小失败: {e}，将检查所有文件")
+        return list(required_files)
+    
+    expected_sizes = {s.rfilename: s.size for s in siblings}
+    missing_files = []
+    for file_path in required_files:
+        local_file = os.path.join(local_dir, file_path)
+        expected_size = expected_sizes.get(file_path)
+        if expected_size is not None and os.path.exists(local_file) and os.path.getsize(local_file) == expected_size:
+            print(f"  ⏭️ 已存在，跳过: {file_path}")
+            continue
+        missing_files.append(file_path)
+    return missing_files
 
 def download_model(use_q4f16=False):
+    """
     下载模型必需文件到当前目录
     
     Args:
@@ -53,19 +104,24 @@ def download_model(use_q4f16=False):
     print("这可能需要5-15分钟，请耐心等待...\n")
     
     try:
-        downloaded_files = []
+        missing_files = find_missing_files(repo_id, local_dir, required_files)
         
-        for file_path in required_files:
-            print(f"正在下载: {file_path}...")
-            local_file = hf_hub_download(
+        # 一次解析仓库文件列表，按allow_patterns过滤后由snapshot_download内部并发下载，
+        # 避免逐个文件调用hf_hub_download时重复的元数据请求
+        if missing_files:
+            snapshot_download(
                 repo_id=repo_id,
-                filename=file_path,
                 local_dir=local_dir,
-                local_dir_use_symlinks=False,
-                resume_download=True
+                allow_patterns=missing_files,
+                max_workers=MAX_WORKERS,
+                local_dir_use_symlinks=False
             )
-            downloaded_files.append(local_file)
-            print(f"  ✅ 完成: {os.path.basename(local_file)}")
+        downloaded_files = [os.path.join(local_dir, f) for f in required_files]
+        
+        # allow_patterns只是过滤条件，仓库中不存在的文件会被静默跳过，需要显式检查
+        not_found = [f for f, path in zip(required_files, downloaded_files) if not os.path.exists(path)]
+        if not_found:
+            raise FileNotFoundError(f"仓库 {repo_id} 中未找到以下必需文件: {', '.join(not_found)}")
         
         print("\n✅ 所有必需文件下载完成！")
         print(f"\n文件位置: {os.path.abspath(local_dir)}")
@@ -32,3 +32,170 @@ def generate(input_ids, past_key_values):
         "all_input_ids": input_ids,
         "logits": outputs[0][:, -1:, :],
     }), outputs[1:]
+
+
+# ---------------------------------------------------------------------------
+# 以下为优化写法示例（非qwen2-export-onnx原始代码），上面的原始代码保持不变以便对比
+# ---------------------------------------------------------------------------
+
+# 3. 预分配KV缓存（替代每一步为2*n_layer个张量重新分配内存）
+# KV缓存的最大序列长度（超过后需要截断或重新开始会话）
+MAX_LEN = 2048
+
+def allocate_kv_buffer():
+    """
+    一次性分配所有层的KV缓存
+    
+    形状: (2, 2*n_layer, n_kv_heads*MAX_LEN*dim_head)
+    - 第0维是两块交替使用的缓冲区：上一步的present作为这一步的past，
+      同一块内存不能同时作为输入和输出
+    - 每个张量按扁平数组存储，前n_kv_heads*kv_len*dim_head个元素就是
+      形状为(1, n_kv_heads, kv_len, dim_head)的连续内存，可以零拷贝reshape
+    """
+    return np.zeros((2, 2 * n_layer, n_kv_heads * MAX_LEN * dim_head), np.float16)
+
+def bind_kv(binding, kv_buffer, slot, kv_len, input_len):
+    """
+    把KV输入/输出直接绑定到预分配缓冲区，ONNX Runtime原地读写，不再经过numpy往返复制
+    
+    past从slot块读取，present直接写入另一块（序列长度 = kv_len + input_len）
+    """
+    next_len = kv_len + input_len
+    # present通过裸指针绑定，超出MAX_LEN会写到下一个张量甚至缓冲区之外，必须在绑定前检查
+    if next_len > MAX_LEN:
+        raise ValueError(f"KV缓存长度{next_len}超过MAX_LEN={MAX_LEN}，需要截断输入或重新开始会话")
+    for i in range(n_layer):
+        for index, past_name, present_name in (
+            (2 * i, "past_key_in" + str(i), "present_key_out" + str(i)),
+            (2 * i + 1, "past_value_in" + str(i), "present_value_out" + str(i)),
+        ):
+            binding.bind_input(
+                name=past_name, device_type="cpu", device_id=0, element_type=np.float16,
+                shape=(1, n_kv_heads, kv_len, dim_head),
+                buffer_ptr=kv_buffer[slot, index].ctypes.data,
+            )
+            binding.bind_output(
+                name=present_name, device_type="cpu", device_id=0, element_type=np.float16,
+                shape=(1, n_kv_heads, next_len, dim_head),
+                buffer_ptr=kv_buffer[1 - slot, index].ctypes.data,
+            )
+
+def generate_preallocated(input_ids, kv_buffer, slot, kv_len, binding):
+    """
+    与generate()等价，但KV缓存通过io_binding绑定到预分配缓冲区
+    
+    binding在会话开始时创建一次：binding = session.io_binding()
+    
+    Returns:
+        (logits结果, 下一步使用的slot, 下一步的kv_len)
+    """
+    binding.clear_binding_inputs()
+    binding.clear_binding_outputs()
+    binding.bind_cpu_input("input_ids", input_ids)
+    binding.bind_cpu_input("attention_mask", np.ones_like(input_ids))
+    # 第一个输出（最后一层hidden）的形状随输入变化，交给ONNX Runtime分配
+    # 先于KV绑定，使它位于binding.get_outputs()的第一个
+    binding.bind_output(session.get_outputs()[0].name, "cpu")
+    bind_kv(binding, kv_buffer, slot, kv_len, input_ids.shape[1])
+    
+    session.run_with_iobinding(binding)
+    hidden = binding.get_outputs()[0].numpy()
+    
+    return logits_session.run(None, {
+        "all_input_ids": input_ids,
+        "logits": hidden[:, -1:, :],
+    }), 1 - slot, kv_len + input_ids.shape[1]
+
+# 使用方式（替代get_reply_with_implicit_history中的past_key_values列表）：
+#     kv_buffer = allocate_kv_buffer()
+#     binding = session.io_binding()
+#     slot, kv_len = 0, 0  # kv_len=0 对应原始代码中seq_len=0的空缓存
+#     logits, slot, kv_len = generate_preallocated(input_ids, kv_buffer, slot, kv_len, binding)
+
+# 关于INT8 KV缓存：
+# decoder的past_key_in/past_value_in输入是float16，在不重新导出decoder的前提下，
+# 即使在Python侧用int8保存KV，每一步也必须先反量化回float16再交给ONNX Runtime，
+# ORT读取的字节数不变，还多了一次完整的反量化计算。
+# 只有把DequantizeLinear导出进decoder计算图（KV输入改为int8 + 每token的scale）时才有收益，
+# 因此这里保持float16。
+
+# 关于分页（PagedAttention）KV布局：
+# 分块布局(num_blocks, n_kv_heads, 16, dim_head) + block_table需要decoder在图内按块表寻址，
+# 这要求重新导出decoder并注册自定义attention算子，不属于本参考代码的范围。
+# 单会话、单batch的场景下，上面的预分配缓冲区已经消除了逐步重新分配，
+# 分页布局的主要收益（多会话并发、前缀复用）在这里用不到。
+
+# 4. 合并decoder与logits两个模型（离线执行一次）
+# 合并后每一步只调用一次ONNX Runtime，[:, -1:, :]切片在图内完成，
+# 完整的(1, seq, hidden)中间结果不再传回Python。
+# 注意：本项目使用的onnx-community的decoder_model_merged本身就直接输出logits，
+# 这一步只针对qwen2-export-onnx这种decoder与logits分开导出的模型。
+# 两个分别导出的torch模型常有同名的自动生成节点/张量（如 /Constant_output_0），
+# merge_models遇到重名会报错，因此logits模型的所有名字加上该前缀
+LOGITS_PREFIX = "logits/"
+
+def merge_decoder_and_logits(decoder_path, logits_path, output_path):
+    """把decoder的最后一层hidden切片后接到logits模型的"logits"输入，保存为一个模型"""
+    import os
+    import onnx
+    from onnx import compose, helper, numpy_helper
+    
+    decoder = onnx.load(decoder_path)
+    logits_model = onnx.load(logits_path)
+    graph = decoder.graph
+    
+    # 在decoder末尾追加Slice，只保留最后一个位置，并用它替换原来的hidden输出
+    hidden = graph.output[0]
+    last_name = hidden.name + "_last"
+    graph.initializer.extend([
+        numpy_helper.from_array(np.array([-1], np.int64), last_name + "_starts"),
+        numpy_helper.from_array(np.array([np.iinfo(np.int64).max], np.int64), last_name + "_ends"),
+        numpy_helper.from_array(np.array([1], np.int64), last_name + "_axes"),
+    ])
+    graph.node.append(helper.make_node(
+        "Slice",
+        [hidden.name, last_name + "_starts", last_name + "_ends", last_name + "_axes"],
+        [last_name],
+    ))
+    # 输出形状沿用hidden，序列维度变为1（merge_models的检查要求输出带有shape）
+    last_output = onnx.ValueInfoProto()
+    last_output.CopyFrom(hidden)
+    last_output.name = last_name
+    seq_dim = last_output.type.tensor_type.shape.dim[1]
+    seq_dim.Clear()
+    seq_dim.dim_value = 1
+    del graph.output[0]
+    graph.output.insert(0, last_output)
+    
+    merged = compose.merge_models(
+        decoder, logits_model,
+        io_map=[(last_name, "logits")],  # merge_models会自动给io_map中的g2名字加上prefix2
+        prefix2=LOGITS_PREFIX,
+    )
+    # 合并后的模型包含全部权重，超过protobuf的2GB限制时只能使用外部数据格式保存
+    onnx.save(
+        merged, output_path,
+        save_as_external_data=True,
+        all_tensors_to_one_file=True,
+        location=os.path.basename(output_path) + ".data",
+    )
+
+def generate_fused(input_ids, kv_buffer, slot, kv_len, binding):
+    """
+    与generate_preallocated()等价，使用合并后的模型（fused_session）
+    
+    binding在会话开始时创建一次：binding = fused_session.io_binding()
+    """
+    binding.clear_binding_inputs()
+    binding.clear_binding_outputs()
+    binding.bind_cpu_input("input_ids", input_ids)
+    binding.bind_cpu_input("attention_mask", np.ones_like(input_ids))
+    binding.bind_cpu_input(LOGITS_PREFIX + "all_input_ids", input_ids)
+    # logits相关输出先于KV绑定，使它们位于binding.get_outputs()的最前面
+    logits_names = [o.name for o in fused_session.get_outputs() if not o.name.startswith("present_")]
+    for name in logits_names:
+        binding.bind_output(name, "cpu")
+    bind_kv(binding, kv_buffer, slot, kv_len, input_ids.shape[1])
+    
+    fused_session.run_with_iobinding(binding)
+    return [value.numpy() for value in binding.get_outputs()[:len(logits_names)]], 1 - slot, kv_len + input_ids.shape[1]
@@ -3,16 +3,22 @@
 """
 检查ONNX模型的输入节点定义
 用于理解模型对输入张量的形状要求
+
+使用方法：
+    python check_onnx_inputs.py <模型文件路径>                  # 仅使用onnx库解析
+    python check_onnx_inputs.py <模型文件路径> --with-runtime   # 额外使用onnxruntime验证
 """
 
+import argparse
+import os
 import sys
 import io
+import mmap
 try:
     import onnx
-    import onnxruntime as ort
 except ImportError:
-    print("错误: 需要安装 onnx 和 onnxruntime")
-    print("请运行: pip install onnx onnxruntime")
+    print("错误: 需要安装 onnx")
+    print("请运行: pip install onnx")
     sys.exit(1)
 
 # 设置UTF-8编码以避免Windows控制台编码问题
@@ -20,27 +26,108 @@ if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 
+# protobuf字段编号（见onnx.proto）
+MODEL_GRAPH_FIELD = 7     # ModelProto.graph
+GRAPH_INPUT_FIELD = 11    # GraphProto.input
+
+def _read_varint(buf, pos):
+    """读取protobuf varint，返回(值, 新位置)"""
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+def _iter_fields(buf, start, end):
+    """
+    遍历[start, end)范围内的protobuf字段，产出(字段编号, wire type, 值起始位置, 值结束位置)
+    
+    只读取字段头，不读取字段内容，因此跳过权重（initializer）时不会访问对应的内存页
+    """
+    pos = start
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        field_number, wire_type = key >> 3, key & 0x07
+        if wire_type == 0:  # varint
+            _, value_end = _read_varint(buf, pos)
+        elif wire_type == 1:  # fixed64
+            value_end = pos + 8
+        elif wire_type == 2:  # length-delimited
+            length, pos = _read_varint(buf, pos)
+            value_end = pos + length
+        elif wire_type == 5:  # fixed32
+            value_end = pos + 4
+        else:
+            raise ValueError(f"不支持的protobuf wire type: {wire_type}")
+        yield field_number, wire_type, pos, value_end
+        pos = value_end
+
+def load_graph_inputs(model_path):
+    """
+    只解析模型的graph.input，返回ValueInfoProto列表
+    
+    graph.input在序列化结果中位于node和initializer之后（接近文件末尾），
+    因此通过mmap逐个跳过其他字段，只把输入节点的几KB数据交给protobuf解析，
+    不需要像onnx.load那样把整个模型（包括权重）读入内存
+    """
+    with open(model_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            inputs = []
+            found_graph = False
+            for field_number, wire_type, start, end in _iter_fields(mm, 0, len(mm)):
+                if field_number != MODEL_GRAPH_FIELD or wire_type != 2:
+                    continue
+                found_graph = True
+                for graph_field, graph_wire_type, value_start, value_end in _iter_fields(mm, start, end):
+                    if graph_field == GRAPH_INPUT_FIELD and graph_wire_type == 2:
+                        value_info = onnx.ValueInfoProto()
+                        value_info.ParseFromString(mm[value_start:value_end])
+                        inputs.append(value_info)
+            # 非ONNX文件也可能恰好是合法的protobuf编码，没有graph字段时交给onnx.load报告真正的错误
+            if not found_graph:
+                raise ValueError("文件中没有ModelProto.graph字段，可能不是ONNX模型")
+            return inputs
+
+def _format_dim(dim):
+    """数字维度原样输出，符号维度加引号"""
+    return str(dim) if type(dim) is int else f'"{dim}"'
+
+def format_shape(shape):
+    """格式化形状，如 ["batch_size", 2, "past_sequence_length", 128]"""
+    return '[' + ', '.join(map(_format_dim, shape)) + ']'
+
 def analyze_onnx_model(model_path):
     """分析ONNX模型的输入节点"""
     print(f"正在分析模型: {model_path}")
     print("=" * 80)
     
-    # 使用onnx库加载模型
+    # 只解析输入节点（不加载权重）
     try:
-        model = onnx.load(model_path)
-        print("✅ 模型加载成功（使用onnx库）\n")
+        inputs = load_graph_inputs(model_path)
+        print("✅ 输入节点解析成功（使用mmap只读取graph.input）\n")
     except Exception as e:
-        print(f"❌ 使用onnx库加载失败: {e}")
-        return
+        print(f"⚠️ 直接解析graph.input失败: {e}，改为使用onnx.load加载完整模型")
+        # 使用onnx库加载模型（只需要输入节点信息，不加载外部权重数据）
+        try:
+            model = onnx.load(model_path, load_external_data=False)
+            # onnx.load对恰好是合法protobuf编码的非ONNX文件也不会报错，需要检查graph是否存在
+            if not model.HasField("graph"):
+                raise ValueError("模型中没有graph，文件可能不是ONNX模型")
+            inputs = model.graph.input
+            print("✅ 模型加载成功（使用onnx库）\n")
+        except Exception as e:
+            print(f"❌ 使用onnx库加载失败: {e}")
+            return
     
     # 分析输入节点
     print("=" * 80)
     print("输入节点分析（使用onnx库）")
     print("=" * 80)
     
-    graph = model.graph
-    inputs = graph.input
-    
     print(f"\n输入节点总数: {len(inputs)}\n")
     
     # 分类输入节点
@@ -49,6 +136,7 @@ def analyze_onnx_model(model_path):
     position_ids_inputs = []
     past_key_values_inputs = []
     other_inputs = []
+    all_inputs = []
     
     for input_tensor in inputs:
         name = input_tensor.name
@@ -58,8 +146,10 @@ def analyze_onnx_model(model_path):
         input_info = {
             'name': name,
             'shape': shape,
+            'shape_str': format_shape(shape),
             'type': input_tensor.type.tensor_type.elem_type
         }
+        all_inputs.append(input_info)
         
         if 'inputs_embeds' in name.lower() or name == 'inputs_embeds':
             inputs_embeds_inputs.append(input_info)
@@ -76,57 +166,91 @@ def analyze_onnx_model(model_path):
     if inputs_embeds_inputs:
         print("\n【inputs_embeds相关输入】")
         for info in inputs_embeds_inputs:
-            shape_str = '[' + ', '.join(str(d) if isinstance(d, int) else f'"{d}"' for d in info['shape']) + ']'
-            print(f"  - {info['name']}: 形状={shape_str}")
+            print(f"  - {info['name']}: 形状={info['shape_str']}")
     
     if attention_mask_inputs:
         print("\n【attention_mask相关输入】")
         for info in attention_mask_inputs:
-            shape_str = '[' + ', '.join(str(d) if isinstance(d, int) else f'"{d}"' for d in info['shape']) + ']'
-            print(f"  - {info['name']}: 形状={shape_str}")
+            print(f"  - {info['name']}: 形状={info['shape_str']}")
     
     if position_ids_inputs:
         print("\n【position_ids相关输入】")
         for info in position_ids_inputs:
-            shape_str = '[' + ', '.join(str(d) if isinstance(d, int) else f'"{d}"' for d in info['shape']) + ']'
-            print(f"  - {info['name']}: 形状={shape_str}")
+            print(f"  - {info['name']}: 形状={info['shape_str']}")
     
     if past_key_values_inputs:
         print(f"\n【past_key_values相关输入】（共{len(past_key_values_inputs)}个）")
         # 只显示前几个和最后一个
         for i, info in enumerate(past_key_values_inputs[:3]):
-            shape_str = '[' + ', '.join(str(d) if isinstance(d, int) else f'"{d}"' for d in info['shape']) + ']'
-            print(f"  - {info['name']}: 形状={shape_str}")
+            print(f"  - {info['name']}: 形状={info['shape_str']}")
         if len(past_key_values_inputs) > 6:
             print(f"  ... (省略{len(past_key_values_inputs) - 6}个) ...")
         for info in past_key_values_inputs[-3:]:
-            shape_str = '[' + ', '.join(str(d) if isinstance(d, int) else f'"{d}"' for d in info['shape']) + ']'
-            print(f"  - {info['name']}: 形状={shape_str}")
+            print(f"  - {info['name']}: 形状={info['shape_str']}")
     
     if other_inputs:
         print("\n【其他输入】")
         for info in other_inputs:
-            shape_str = '[' + ', '.join(str(d) if isinstance(d, int) else f'"{d}"' for d in info['shape']) + ']'
-            print(f"  - {info['name']}: 形状={shape_str}")
+            print(f"  - {info['name']}: 形状={info['shape_str']}")
+    
+    # 逐个输入节点的详细信息（类型、动态维度）
+    # 注意：onnx库已经给出完整的输入元数据，无需再创建onnxruntime.InferenceSession
+    print("\n" + "=" * 80)
+    print("输入节点详细信息")
+    print("=" * 80)
+    print()
+    
+    for info in all_inputs:
+        shape = info['shape']
+        # 与onnxruntime的NodeArg.type保持一致的格式，如 tensor(float16)
+        type_str = f"tensor({onnx.TensorProto.DataType.Name(info['type']).lower()})"
+        
+        print(f"输入: {info['name']}")
+        print(f"  形状: {shape}")
+        print(f"  类型: {type_str}")
+        
+        # 分析动态维度
+        dynamic_dims = [i for i, dim in enumerate(shape) if isinstance(dim, str) or dim < 0]
+        if dynamic_dims:
+            print(f"  动态维度索引: {dynamic_dims}")
+        print()
+
+def analyze_with_onnxruntime(model_path):
+    """
+    使用onnxruntime验证输入节点（可选，通过 --with-runtime 启用）
+    
+    这里只读取输入元数据，不做推理，因此关闭图优化、线程池和内存预分配，
+    让InferenceSession的创建尽量轻量
+    """
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        print("❌ 需要安装 onnxruntime 才能使用 --with-runtime")
+        print("   请运行: pip install onnxruntime")
+        return
     
-    # 使用onnxruntime检查输入节点
     print("\n" + "=" * 80)
     print("输入节点分析（使用onnxruntime）")
     print("=" * 80)
     
+    sess_options = ort.SessionOptions()
+    sess_options.intra_op_num_threads = 1
+    sess_options.inter_op_num_threads = 1
+    sess_options.enable_mem_pattern = False
+    sess_options.enable_cpu_mem_arena = False
+    sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+    
     try:
-        session = ort.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+        session = ort.InferenceSession(model_path, sess_options, providers=['CPUExecutionProvider'])
         
         print(f"\n输入节点总数: {len(session.get_inputs())}\n")
         
         for input_meta in session.get_inputs():
-            name = input_meta.name
             shape = input_meta.shape
-            type_str = input_meta.type
             
-            print(f"输入: {name}")
+            print(f"输入: {input_meta.name}")
             print(f"  形状: {shape}")
-            print(f"  类型: {type_str}")
+            print(f"  类型: {input_meta.type}")
             
             # 分析动态维度
             dynamic_dims = [i for i, dim in enumerate(shape) if isinstance(dim, str) or (isinstance(dim, int) and dim < 0)]
@@ -136,11 +260,13 @@ def analyze_onnx_model(model_path):
         
     except Exception as e:
         print(f"❌ 使用onnxruntime加载失败: {e}")
-        print("   注意: 这可能是因为模型文件不存在或路径错误")
-        print("   请确保模型文件路径正确")
 
 def main():
-    import os
+    parser = argparse.ArgumentParser(description="检查ONNX模型的输入节点定义")
+    parser.add_argument("model_path", nargs="?", help="模型文件路径（不提供时在常见位置查找）")
+    parser.add_argument("--with-runtime", action="store_true",
+                        help="额外创建onnxruntime.InferenceSession验证输入（默认只解析模型文件，不加载运行时）")
+    args = parser.parse_args()
     
     # 尝试常见的模型路径
     possible_paths = [
@@ -153,8 +279,8 @@ def main():
     ]
     
     # 如果提供了命令行参数，使用命令行参数
-    if len(sys.argv) > 1:
-        model_path = sys.argv[1]
+    if args.model_path:
+        model_path = args.model_path
     else:
         # 尝试查找模型文件
         model_path = None
@@ -166,7 +292,7 @@ def main():
         if not model_path:
             print("错误: 未找到模型文件")
             print("\n请提供模型文件路径作为命令行参数:")
-            print(f"  python {sys.argv[0]} <模型文件路径>")
+            print(f"  python {sys.argv[0]} <模型文件路径> [--with-runtime]")
             print("\n或者将模型文件放在以下位置之一:")
             for path in possible_paths:
                 print(f"  - {path}")
@@ -177,6 +303,8 @@ def main():
         sys.exit(1)
     
     analyze_onnx_model(model_path)
+    if args.with_runtime:
+        analyze_with_onnxruntime(model_path)
 
 if __name__ == "__main__":
     main()
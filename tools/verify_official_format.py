@@ -14,10 +14,26 @@ if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 
+MODEL_ID = "Qwen/Qwen2-VL-2B-Instruct"
+
+def load_tokenizer():
+    """
+    加载fast tokenizer（Rust实现）
+    
+    优先只使用本地HF缓存，避免每次运行都联网校验；缓存不存在时才从网络下载
+    """
+    try:
+        return AutoTokenizer.from_pretrained(
+            MODEL_ID, use_fast=True, trust_remote_code=True, local_files_only=True
+        )
+    except OSError:
+        print("本地缓存中未找到tokenizer，正在从网络下载...")
+        return AutoTokenizer.from_pretrained(MODEL_ID, use_fast=True, trust_remote_code=True)
+
 def main():
     # 初始化tokenizer（只需要tokenizer来验证chat_template格式）
     print("正在加载tokenizer...")
-    tokenizer = AutoTokenizer.from_pretrained("Qwen/Qwen2-VL-2B-Instruct", trust_remote_code=True)
+    tokenizer = load_tokenizer()
     print("Tokenizer加载完成\n")
     
     # 构建messages（模拟我们的场景）
@@ -39,17 +55,14 @@ def main():
     print("=" * 80)
     
     # 测试1：不使用generation prompt
-    text_input_no_prompt = tokenizer.apply_chat_template(
-        messages, tokenize=False, add_generation_prompt=False
+    # 模板渲染与分词一次完成（内部已使用add_special_tokens=False）
+    token_ids_no_prompt = tokenizer.apply_chat_template(
+        messages, tokenize=True, add_generation_prompt=False, return_dict=False
     )
     print("\n生成的文本格式：")
-    print(text_input_no_prompt)
+    print(tokenizer.decode(token_ids_no_prompt))
     print()
     
-    # Tokenize并查看token信息
-    token_ids_no_prompt = tokenizer.encode(
-        text_input_no_prompt, add_special_tokens=False
-    )
     print(f"Token数量: {len(token_ids_no_prompt)}")
     print(f"\n前30个tokens: {token_ids_no_prompt[:30]}")
     print(f"后30个tokens: {token_ids_no_prompt[-30:]}")
@@ -65,16 +78,13 @@ def main():
     print("=" * 80)
     
     # 测试2：使用generation prompt
-    text_input_with_prompt = tokenizer.apply_chat_template(
-        messages, tokenize=False, add_generation_prompt=True
+    token_ids_with_prompt = tokenizer.apply_chat_template(
+        messages, tokenize=True, add_generation_prompt=True, return_dict=False
     )
     print("\n生成的文本格式：")
-    print(text_input_with_prompt)
+    print(tokenizer.decode(token_ids_with_prompt))
     print()
     
-    token_ids_with_prompt = tokenizer.encode(
-        text_input_with_prompt, add_special_tokens=False
-    )
     print(f"Token数量: {len(token_ids_with_prompt)}")
     print(f"\n前30个tokens: {token_ids_with_prompt[:30]}")
     print(f"后30个tokens: {token_ids_with_prompt[-30:]}")
@@ -88,22 +98,24 @@ def main():
     print("关键token ID检查")
     print("=" * 80)
     
-    # 检查关键token的ID
-    vision_start_id = tokenizer.convert_tokens_to_ids("<|vision_start|>")
-    vision_end_id = tokenizer.convert_tokens_to_ids("<|vision_end|>")
-    im_start_id = tokenizer.convert_tokens_to_ids("<|im_start|>")
-    im_end_id = tokenizer.convert_tokens_to_ids("<|im_end|>")
+    # 检查关键token的ID（一次调用批量转换）
+    im_start_id, im_end_id, vision_start_id, vision_end_id = tokenizer.convert_tokens_to_ids(
+        ["<|im_start|>", "<|im_end|>", "<|vision_start|>", "<|vision_end|>"]
+    )
     
     print(f"<|im_start|> ID: {im_start_id}")
     print(f"<|im_end|> ID: {im_end_id}")
     print(f"<|vision_start|> ID: {vision_start_id}")
     print(f"<|vision_end|> ID: {vision_end_id}")
     
-    # 检查这些token在序列中的位置
-    print(f"\n<|im_start|>在序列中的位置: {token_ids_no_prompt.index(im_start_id) if im_start_id in token_ids_no_prompt else 'Not found'}")
-    print(f"<|vision_start|>在序列中的位置: {token_ids_no_prompt.index(vision_start_id) if vision_start_id in token_ids_no_prompt else 'Not found'}")
-    print(f"<|vision_end|>在序列中的位置: {token_ids_no_prompt.index(vision_end_id) if vision_end_id in token_ids_no_prompt else 'Not found'}")
-    print(f"<|im_end|>在序列中的位置: {token_ids_no_prompt.index(im_end_id) if im_end_id in token_ids_no_prompt else 'Not found'}")
+    # 检查这些token在序列中的位置（单次遍历记录每个token首次出现的位置）
+    first_pos = {}
+    for i, token_id in enumerate(token_ids_no_prompt):
+        first_pos.setdefault(token_id, i)
+    print(f"\n<|im_start|>在序列中的位置: {first_pos.get(im_start_id, 'Not found')}")
+    print(f"<|vision_start|>在序列中的位置: {first_pos.get(vision_start_id, 'Not found')}")
+    print(f"<|vision_end|>在序列中的位置: {first_pos.get(vision_end_id, 'Not found')}")
+    print(f"<|im_end|>在序列中的位置: {first_pos.get(im_end_id, 'Not found')}")
     
     print("\n" + "=" * 80)
     print("序列结构分析")